@@ -0,0 +1,123 @@
+import sys
+sys.path.append('../')
+
+import os
+import json
+import time
+import importlib
+
+import torch
+import pytorch_lightning as pl
+from torch.utils.data import DataLoader, Dataset
+
+from MVTSF.run import random_seed, get_parser
+from MVTSF.model.Student import Student
+from MVTSF.util.checkpoint import load_model_from_checkpoint
+from MVTSF.util.metric import get_score
+
+
+class DistillationDataset(Dataset):
+    # Appends the cached teacher forecast to every sample of a BasicDataset
+    def __init__(self, dataset, teacher_sales):
+        super().__init__()
+        self.dataset = dataset
+        self.teacher_sales = teacher_sales
+
+    def __getitem__(self, idx):
+        return (*self.dataset[idx], self.teacher_sales[idx])
+
+    def __len__(self):
+        return len(self.dataset)
+
+
+def predict(model, dataset, batch_size):
+    model.eval()
+    with torch.no_grad():
+        return torch.cat([model.phase_step(batch, phase='predict') for batch in DataLoader(dataset, batch_size=batch_size, shuffle=False)], dim=0)
+
+def items_per_second(model, dataset, batch_size, repeat=3):
+    # Times the forward pass and denormalisation only, phase_step would mostly measure the metric objects of get_score
+    batches = list(DataLoader(dataset, batch_size=batch_size, shuffle=False))
+    def forecast():
+        with torch.no_grad():
+            for batch in batches:
+                output = model(*batch[1:7])
+                model.denormalize(output[0] if isinstance(output, tuple) else output)
+    model.eval()
+    forecast()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        forecast()
+    return repeat * len(dataset) / (time.perf_counter() - start)
+
+def run(args):
+    args.data_dir = args.data_dir + f"/{args.dataset_name}"
+    args.log_dir = args.log_dir + f"/{args.dataset_name}"
+
+    if args.dataset_name == 'MindBridge':
+        args.center, args.scale = 40.89353961781402, 74.34192367524047
+    elif args.dataset_name == 'Visuelle':
+        args.center, args.scale  = 0.0, 875.0
+
+    print(args)
+    random_seed(args.seed)
+
+    teacher, teacher_args = load_model_from_checkpoint(args.teacher_ckpt)
+
+    dataset_module = importlib.import_module("MVTSF.util.datamodule")
+    dataset_cls = getattr(dataset_module, f"{args.dataset_name}DataModule")
+    dataset = dataset_cls(args)
+    dataset.prepare_data()
+    dataset.setup("fit")
+    dataset.setup("test")
+
+    # Teacher forecasts are computed once and cached as training targets
+    teacher_sales = predict(teacher, dataset.train_dataset, args.batch_size)
+    train_dataset = DistillationDataset(dataset.train_dataset, teacher_sales)
+
+    teacher_name = os.path.splitext(os.path.basename(args.teacher_ckpt))[0]
+    checkpoint_callback = pl.callbacks.ModelCheckpoint(
+        dirpath=os.path.join(args.log_dir, "Student"),
+        filename=f'Student-{teacher_name}',
+        monitor='valid_rescaled_adjusted_smape',
+        mode='min',
+        save_top_k=1
+    )
+    # Saved with the student checkpoint, so load_model_from_checkpoint, export.py and inference.py rebuild a Student
+    args.model_name = 'Student'
+    student = Student(args)
+    trainer = pl.Trainer(
+        accelerator='cpu',
+        devices=1,
+        max_epochs=args.num_epochs,
+        logger=False,
+        callbacks=[checkpoint_callback]
+    )
+    trainer.fit(
+        student,
+        train_dataloaders=DataLoader(train_dataset, batch_size=args.batch_size, shuffle=True),
+        val_dataloaders=dataset.val_dataloader()
+    )
+    student, _ = load_model_from_checkpoint(checkpoint_callback.best_model_path)
+
+    report = {}
+    for name, model in [(teacher_args.model_name, teacher), ('Student', student)]:
+        forecast = predict(model, dataset.test_dataset, args.batch_size)
+        score = get_score(dataset.test_dataset.item_sales, forecast)
+        report[name] = {k: v.item() for k, v in score.items()}
+        report[name]['num_parameters'] = sum(p.numel() for p in model.parameters())
+        report[name]['items_per_second'] = items_per_second(model, dataset.test_dataset, args.batch_size)
+
+    print(json.dumps(report, indent=2))
+    json.dump(report, open(os.path.join(args.log_dir, "Student", f"Student-{teacher_name}.json"), "w"), indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    parser = get_parser()
+    parser.add_argument('--teacher_ckpt', type=str, required=True)
+    parser.add_argument('--student_hidden_dim', type=int, default=256)
+    parser.add_argument('--distill_alpha', type=float, default=0.5, help="weight of the teacher target in the loss")
+
+    args = parser.parse_args()
+    run(args)
@@ -0,0 +1,17 @@
+import sys
+sys.path.append('../')
+
+import os
+import argparse
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export a Lightning checkpoint as memory-mappable weights with a JSON hyperparameter sidecar')
+    parser.add_argument('--ckpt_path', type=str, required=True)
+    parser.add_argument('--format', type=str, default='safetensors', choices=['safetensors', 'pt'])
+    args = parser.parse_args()
+
+    from MVTSF.util.checkpoint import export_weights
+    weights_path = os.path.splitext(args.ckpt_path)[0] + f".{args.format}"
+    export_weights(args.ckpt_path, weights_path)
+    print(weights_path)
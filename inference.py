@@ -1,21 +1,15 @@
 import sys
 sys.path.append('../')
 
-import torch
 import argparse
-import numpy as np
-import wandb
 import random
-import pandas as pd
-
-import pytorch_lightning as pl
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 import os
 import importlib
 
 
 def random_seed(seed: int = 42):
+    import torch
+    import numpy as np
     random.seed(seed)
     np.random.seed(seed)
     os.environ["PYTHONHASHSEED"] = str(seed)
@@ -26,38 +20,55 @@ def random_seed(seed: int = 42):
     torch.autograd.set_detect_anomaly(True)
 
 def run(args):
+    # Deferred so that --help does not pay for torch and Lightning
+    from MVTSF.util.writer import ResultWriter
+    from MVTSF.util.checkpoint import load_model_from_checkpoint, copy_hparams
+
     args.data_dir = args.data_dir + f"/{args.dataset_name}"
     args.log_dir = args.log_dir + f"/{args.dataset_name}"
     args.result_dir = args.result_dir + f"/{args.dataset_name}"
 
-    if args.dataset_name == 'MindBridge':
-        args.center = 14.0
-        args.scale = 37.0
-    elif args.dataset_name == 'Visuelle':
-        args.center = 0.0
-        args.scale = 875.0
+    ckpt_path = os.path.join(args.log_dir, args.model_name, args.ckpt_name)
+    ckpt_stem, ckpt_ext = os.path.splitext(args.ckpt_name)
+    # The model is rebuilt from the args stored in the checkpoint, or in the JSON sidecar of weights exported by
+    # export.py, and its hyperparameters (dims, lengths, center/scale, ...) replace the CLI ones. The checkpoint is
+    # loaded once, and both formats of one model produce the same forecasts.
+    exported = ckpt_ext in [".safetensors", ".pt"]
+    model, model_args = load_model_from_checkpoint(ckpt_path)
+    copy_hparams(args, model_args)
+    # .ckpt results keep their original <stem>/ and <stem>.csv, exported formats get their own
+    result_name = f"{ckpt_stem}-{ckpt_ext.lstrip('.')}" if exported else ckpt_stem
 
     print(args)
     random_seed(args.seed)
 
-    model_module = importlib.import_module(f"MVTSF.model.{args.model_name}")
-    model_cls = getattr(model_module, args.model_name)
-    model = model_cls(args)
-
     dataset_module = importlib.import_module("MVTSF.util.datamodule")
     dataset_cls = getattr(dataset_module, f"{args.dataset_name}DataModule")
     dataset = dataset_cls(args)
 
-    trainer = pl.Trainer(
-        devices=[args.gpu_num],
-        logger=False,
-    )
-    ckpt_path = os.path.join(args.log_dir, args.model_name, args.ckpt_name)
-    prediction = trainer.predict(model, ckpt_path=ckpt_path, datamodule=dataset)
-
-    result_df = pd.DataFrame(torch.cat(prediction, dim=0).numpy(), index=dataset.test_dataset.item_ids)
-    result_df.to_csv(os.path.join(args.result_dir, f"{args.ckpt_name}".replace("ckpt","csv")))
-    
+    result_writer = ResultWriter(os.path.join(args.result_dir, result_name), args.result_format)
+    # Resume a partial run by predicting only the items that have no shard on disk yet
+    completed_item_ids = result_writer.completed_item_ids()
+    dataset.test_item_ids = [item_id for item_id in dataset.test_item_ids if item_id not in completed_item_ids]
+
+    if len(dataset.test_item_ids) > 0 and exported:
+        # Memory-mapped weights, predicted without setting up a Lightning Trainer
+        dataset.prepare_data()
+        dataset.setup("predict")
+        for batch_idx, batch in enumerate(dataset.predict_dataloader()):
+            result_writer.write_batch(model.predict_step(batch, batch_idx), dataset.test_dataset.item_ids)
+    elif len(dataset.test_item_ids) > 0:
+        import pytorch_lightning as pl
+        from MVTSF.util.callback import PredictionWriter
+        trainer = pl.Trainer(
+            devices=[args.gpu_num],
+            logger=False,
+            callbacks=[PredictionWriter(result_writer)],
+        )
+        trainer.predict(model, datamodule=dataset, return_predictions=False)
+
+    if args.export_csv:
+        result_writer.export_csv(os.path.join(args.result_dir, f"{result_name}.csv"))
 
 
 if __name__ == '__main__':
@@ -74,9 +85,11 @@ if __name__ == '__main__':
     parser.add_argument('--model_name', type=str, default='Transformer')
     parser.add_argument('--dataset_name', type=str, default='MindBridge')
     parser.add_argument('--ckpt_name', type=str, default='')
+    parser.add_argument('--result_format', type=str, default='auto', choices=['auto', 'parquet', 'npy'])
+    parser.add_argument('--export_csv', action="store_true")
     parser.add_argument('--batch_size', type=int, default=128)
-    parser.add_argument('--embedding_dim', type=int, default=512)
-    parser.add_argument('--hidden_dim', type=int, default=512)
+    parser.add_argument('--input_dim', type=int, default=512)
+    parser.add_argument('--output_dim', type=int, default=512)
     parser.add_argument('--endo_input_len', type=int, default=12)
     parser.add_argument('--exo_input_len', type=int, default=52)
     parser.add_argument('--output_len', type=int, default=12)
@@ -92,6 +105,17 @@ if __name__ == '__main__':
     parser.add_argument('--num_exo_vars', type=int, default=48)
     parser.add_argument("--num_meta", type=int, default=52)
 
+    # Sharded dataset arguments
+    parser.add_argument('--shard_dir', type=str, default='')
+    parser.add_argument('--shard_size', type=int, default=4096)
+    parser.add_argument('--shuffle_buffer', type=int, default=4096)
+
+    # Embedding store arguments
+    parser.add_argument('--embedding_dir', type=str, default='')
+    parser.add_argument('--embedding_dtype', type=str, default='float32', choices=['float32', 'float16'])
+    parser.add_argument('--embedding_compression', type=str, default='none', choices=['none', 'int8', 'pca'])
+    parser.add_argument('--embedding_pca_dim', type=int, default=128)
+
     # wandb arguments
     parser.add_argument('--wandb_entity', type=str, default='bonbak')
     parser.add_argument('--wandb_proj', type=str, default='Multivariate-Time-Series-Forecasting')
@@ -117,12 +117,38 @@ class TransformerDecoderLayer(nn.Module):
             memory_key_padding_mask = None, tgt_is_causal = None, memory_is_causal=False):
         if type(tgt) is tuple: tgt = tgt[0]
         tgt2, attn_weights = self.multihead_attn(tgt, memory.permute(1,0,2), memory.permute(1,0,2))
+        return self._feedforward(tgt, tgt2), attn_weights
+
+    def project_memory(self, memory):
+        # Key/value projections of the cross-attention, computed once per memory and reused across queries
+        d_model = self.multihead_attn.embed_dim
+        weight, bias = self.multihead_attn.in_proj_weight, self.multihead_attn.in_proj_bias
+        key = F.linear(memory, weight[d_model:2*d_model], bias[d_model:2*d_model])
+        value = F.linear(memory, weight[2*d_model:], bias[2*d_model:])
+        return key, value
+
+    def forward_cached(self, tgt, key, value):
+        # tgt: (1, batch, d_model), key/value: (batch or 1, seq_len, d_model) from project_memory
+        attn = self.multihead_attn
+        d_model, num_heads = attn.embed_dim, attn.num_heads
+        head_dim = d_model // num_heads
+        query = F.linear(tgt, attn.in_proj_weight[:d_model], attn.in_proj_bias[:d_model])
+        query = rearrange(query, '1 b (h d) -> b h 1 d', h=num_heads)
+        key = rearrange(key, 'b s (h d) -> b h s d', h=num_heads)
+        value = rearrange(value, 'b s (h d) -> b h s d', h=num_heads)
+
+        attn_weights = torch.softmax(query @ key.transpose(-2, -1) / math.sqrt(head_dim), dim=-1)
+        tgt2 = F.dropout(attn_weights, p=attn.dropout, training=self.training) @ value
+        tgt2 = attn.out_proj(rearrange(tgt2, 'b h 1 d -> 1 b (h d)'))
+        return self._feedforward(tgt, tgt2), attn_weights.mean(dim=1)
+
+    def _feedforward(self, tgt, tgt2):
         tgt = tgt + self.dropout2(tgt2)
         tgt = self.norm2(tgt)
         tgt2 = self.linear2(self.dropout(self.activation(self.linear1(tgt))))
         tgt = tgt + self.dropout3(tgt2)
         tgt = self.norm3(tgt)
-        return tgt, attn_weights
+        return tgt
 
 
 class TemporalFeatureEncoder(nn.Module):
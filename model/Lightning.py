@@ -1,6 +1,9 @@
 import torch
+import torch.nn as nn
 import pytorch_lightning as pl
 
+from MVTSF.util.metric import AdjustedSymmetricMeanAbsolutePercentageError
+
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -8,6 +11,14 @@ class PytorchLightningBase(pl.LightningModule):
     def __init__(self):
         super().__init__()
         self.save_hyperparameters()
+        self.rescaled_adjusted_smape = nn.ModuleDict({
+            f"{phase}_rescaled_adjusted_smape": AdjustedSymmetricMeanAbsolutePercentageError() for phase in ['train', 'valid', 'test']
+        })
+
+    def on_fit_start(self):
+        # Metric states left behind by a trainer.validate() run are inference tensors and cannot be updated in training
+        for metric in self.rescaled_adjusted_smape.values():
+            metric.reset()
 
     def configure_optimizers(self):
         return torch.optim.Adam(self.parameters(), lr=self.lr)
@@ -30,4 +41,12 @@ class PytorchLightningBase(pl.LightningModule):
         self.eval()
         with torch.no_grad():
             predictions = self.phase_step(predict_batch, phase='predict')
-        return predictions
\ No newline at end of file
+        return predictions
+
+    def log_rescaled_score(self, phase, rescaled_score, gt, pred):
+        # The adjusted SMAPE monitored by ModelCheckpoint is logged as a metric object, so under DDP its sums are
+        # reduced across ranks before dividing; the remaining scores are averaged across ranks.
+        name = f"{phase}_rescaled_adjusted_smape"
+        self.rescaled_adjusted_smape[name].update(pred.detach(), gt.detach())
+        self.log(name, self.rescaled_adjusted_smape[name], on_step=False, on_epoch=True)
+        self.log_dict({f"{phase}_rescaled_{k}":v for k,v in rescaled_score.items() if k != 'adjusted_smape'}, on_step=False, on_epoch=True, sync_dist=True)
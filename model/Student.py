@@ -0,0 +1,67 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from MVTSF.model.Lightning import PytorchLightningBase
+from MVTSF.util.metric import get_score
+
+
+class Student(PytorchLightningBase):
+    # Small MLP forecaster distilled from a trained transformer: image/text embeddings, release date and meta
+    # data are concatenated with the mean and last value of every exogenous variable.
+    def __init__(self, args):
+        super().__init__()
+        self.output_len = args.output_len
+        self.input_dim = args.input_dim
+        self.hidden_dim = args.student_hidden_dim
+        self.num_exo_vars = args.num_exo_vars
+        self.num_meta = args.num_meta
+        self.lr = args.learning_rate
+        self.alpha = args.distill_alpha
+        self.center = args.center
+        self.scale = args.scale
+        self.save_hyperparameters()
+
+        self.mlp = nn.Sequential(
+            nn.Linear(self.input_dim * 2 + 4 + self.num_meta + self.num_exo_vars * 2, self.hidden_dim),
+            nn.ReLU(),
+            nn.Dropout(0.1),
+            nn.Linear(self.hidden_dim, self.output_len)
+        )
+
+    def forward(self, endo_inputs, exo_inputs, release_dates, image_embeddings, text_embeddings, meta_data):
+        exo_features = torch.cat([exo_inputs.mean(dim=2), exo_inputs[:, :, -1]], dim=1)
+        features = torch.cat([image_embeddings, text_embeddings, release_dates, meta_data, exo_features], dim=1)
+        return self.mlp(features)
+
+    def phase_step(self, batch, phase):
+        item_sales, endo_inputs, exo_inputs, release_dates, image_embeddings, text_embeddings, meta_data = batch[:7]
+        sales = self.normalize(item_sales)
+
+        forecasted_sales = self.forward(endo_inputs, exo_inputs, release_dates, image_embeddings, text_embeddings, meta_data)
+
+        score = get_score(sales, forecasted_sales)
+        score['loss'] = F.mse_loss(forecasted_sales, sales)
+        if len(batch) == 8:
+            # Training batches carry the teacher forecast (in sales units) as an eighth element
+            teacher_sales = self.normalize(batch[7])
+            score['distill_loss'] = F.mse_loss(forecasted_sales, teacher_sales)
+            score['loss'] = self.alpha * score['distill_loss'] + (1 - self.alpha) * score['loss']
+
+        rescaled_forecasted_sales = self.denormalize(forecasted_sales)
+        rescaled_forecasted_sales = torch.clamp(rescaled_forecasted_sales, min=0)
+        rescaled_score = get_score(item_sales, rescaled_forecasted_sales)
+
+        if phase == 'predict':
+            return rescaled_forecasted_sales
+
+        self.log_dict({f"{phase}_{k}":v for k,v in score.items()}, on_step=False, on_epoch=True, sync_dist=True)
+        self.log_rescaled_score(phase, rescaled_score, item_sales, rescaled_forecasted_sales)
+
+        return score['loss']
+
+    def denormalize(self, x):
+        return (x * self.scale) + self.center
+
+    def normalize(self, x):
+        return (x - self.center) / self.scale
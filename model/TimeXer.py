@@ -4,6 +4,10 @@ from MVTSF.util.metric import get_score
 
     
 class TimeXer(Transformer):
+    # The decoder queries depend on the endogenous encoder output, so the inherited encode_query/encode_memory/
+    # decode_memory do not apply and the cross-attention memory cannot be shared
+    cached_decoding = False
+
     def __init__(self, args):
         super().__init__(args)
         self.save_hyperparameters()
@@ -81,7 +85,7 @@ class TimeXer(Transformer):
         if phase == 'predict': 
             return rescaled_forecasted_sales
 
-        self.log_dict({f"{phase}_rescaled_{k}":v for k,v in rescaled_score.items()}, on_step=False, on_epoch=True)
+        self.log_rescaled_score(phase, rescaled_score, item_sales, forecasted_sales)
         return rescaled_score['loss']
 
 
@@ -10,6 +10,9 @@ import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class Transformer(PytorchLightningBase):
+    # encode_query/encode_memory/decode_memory are available, see scenario.py
+    cached_decoding = True
+
     def __init__(self, args):
         super().__init__()
         self.endo_input_len = args.endo_input_len
@@ -51,6 +54,24 @@ class Transformer(PytorchLightningBase):
 
         return forecast.view(-1, self.output_len), attn_weights
 
+    def encode_query(self, release_dates, image_embeddings, text_embeddings, meta_data):
+        temporal_embedding = self.temporal_feature_encoder(release_dates)
+        return self.feature_fusion_network(image_embeddings, text_embeddings, temporal_embedding, meta_data)
+
+    def encode_memory(self, exo_inputs):
+        # Encodes the exogenous context once and caches the cross-attention keys/values of every decoder layer.
+        # A memory with batch size 1 is broadcast against any number of queries in decode_memory.
+        encoder_embedding = self.transformer_encoder(exo_inputs)
+        return [layer.project_memory(encoder_embedding) for layer in self.decoder.layers]
+
+    def decode_memory(self, query, memory_cache):
+        tgt = query.unsqueeze(0)
+        for layer, (key, value) in zip(self.decoder.layers, memory_cache):
+            tgt, attn_weights = layer.forward_cached(tgt, key, value)
+        forecast = self.decoder_fc(tgt)
+
+        return forecast.view(-1, self.output_len), attn_weights
+
     def phase_step(self, batch, phase):
         item_sales, endo_inputs, exo_inputs, release_dates, image_embeddings, text_embeddings, meta_data = batch
         sales = self.normalize(item_sales)
@@ -67,8 +88,8 @@ class Transformer(PytorchLightningBase):
         if phase == 'predict': 
             return rescaled_forecasted_sales
 
-        self.log_dict({f"{phase}_{k}":v for k,v in score.items()}, on_step=False, on_epoch=True)
-        self.log_dict({f"{phase}_rescaled_{k}":v for k,v in rescaled_score.items()}, on_step=False, on_epoch=True)
+        self.log_dict({f"{phase}_{k}":v for k,v in score.items()}, on_step=False, on_epoch=True, sync_dist=True)
+        self.log_rescaled_score(phase, rescaled_score, item_sales, rescaled_forecasted_sales)
 
         return score['loss']
     
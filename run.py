@@ -1,22 +1,17 @@
 import sys
 sys.path.append('../')
 
-import torch
 import argparse
-import numpy as np
-import wandb
 import random
 import datetime
-
-import pytorch_lightning as pl
-from pytorch_lightning import loggers as pl_loggers
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 import os
+import pickle
 import importlib
 
 
 def random_seed(seed: int = 42):
+    import torch
+    import numpy as np
     random.seed(seed)
     np.random.seed(seed)
     os.environ["PYTHONHASHSEED"] = str(seed)
@@ -26,7 +21,30 @@ def random_seed(seed: int = 42):
     torch.backends.cudnn.benchmark = False 
     torch.autograd.set_detect_anomaly(True)
 
-def run(args):
+def finetune_item_ids(train_item_ids, args):
+    # New/changed items plus a fixed-seed replay sample of replay_ratio of the remaining training items
+    if not args.new_item_ids:
+        return train_item_ids
+    # Changed valid/test items are left out, training on them would inflate the score compared against the previous model
+    train_item_id_set = set(train_item_ids)
+    new_item_ids = [item_id for item_id in pickle.load(open(args.new_item_ids, 'rb')) if item_id in train_item_id_set]
+    new_item_id_set = set(new_item_ids)
+    old_item_ids = [item_id for item_id in train_item_ids if item_id not in new_item_id_set]
+    replay_item_ids = random.Random(args.seed).sample(old_item_ids, int(len(old_item_ids) * args.replay_ratio))
+    return new_item_ids + replay_item_ids
+
+def run(args, dataset=None, test=True):
+    # Deferred so that --help and argument errors do not pay for torch, Lightning and wandb
+    import torch
+    import pytorch_lightning as pl
+    from pytorch_lightning.strategies import DDPStrategy
+    from MVTSF.util.callback import EpochTimer
+    from MVTSF.util.checkpoint import load_state_dict
+
+    # Checkpoints store the argparse namespace as hyperparameters, newer torch only unpickles allowlisted globals
+    if hasattr(torch.serialization, 'add_safe_globals'):
+        torch.serialization.add_safe_globals([argparse.Namespace])
+
     args.data_dir = args.data_dir + f"/{args.dataset_name}"
     args.log_dir = args.log_dir + f"/{args.dataset_name}"
 
@@ -43,40 +61,94 @@ def run(args):
     model_cls = getattr(model_module, args.model_name)
     model = model_cls(args)
 
-    dataset_module = importlib.import_module("MVTSF.util.datamodule")
-    dataset_cls = getattr(dataset_module, f"{args.dataset_name}DataModule")
-    dataset = dataset_cls(args)
+    if dataset is None:
+        dataset_module = importlib.import_module("MVTSF.util.datamodule")
+        dataset_cls = getattr(dataset_module, f"{args.dataset_name}DataModule")
+        dataset = dataset_cls(args)
+
+    if args.finetune_ckpt:
+        # Warm start from the previous best model instead of a random initialisation
+        model.load_state_dict(load_state_dict(args.finetune_ckpt))
+        dataset.train_item_ids = finetune_item_ids(dataset.train_item_ids, args)
+
+    # DDP re-launches this script once per rank, the environment keeps the run name identical across ranks
+    run_time = os.environ.setdefault("MVTSF_RUN_TIME", datetime.datetime.now().strftime("%y%m%d-%H%M"))
 
     checkpoint_callback = pl.callbacks.ModelCheckpoint(
         dirpath=os.path.join(args.log_dir,args.model_name),
-        filename=f'{args.model_name}-{datetime.datetime.now().strftime("%y%m%d-%H%M")}',
+        filename=f'{args.model_name}-{run_time}',
         monitor='valid_rescaled_adjusted_smape',
         mode='min',
-        save_top_k=1
+        save_top_k=1,
+        save_last=args.save_last
     )
 
-    wandb.require("core")
-    wandb.init(
-        entity=args.wandb_entity, 
-        project=args.wandb_proj +'-'+ args.dataset_name, 
-        name=f'{args.model_name}-{datetime.datetime.now().strftime("%y%m%d-%H%M")}',
-        dir=args.wandb_dir
-    )
-    wandb_logger = pl_loggers.WandbLogger()
+    if args.logger == 'local':
+        # Buffered in memory and appended to log_dir/metrics/<run>/metrics.jsonl by a background thread
+        from MVTSF.util.logger import LocalLogger
+        logger = LocalLogger(save_dir=os.path.join(args.log_dir, "metrics"), name=args.model_name, version=f'{args.model_name}-{run_time}')
+    else:
+        import wandb
+        from pytorch_lightning import loggers as pl_loggers
+        import urllib3
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        wandb.require("core")
+        # WandbLogger only starts the wandb run on global rank zero
+        logger = pl_loggers.WandbLogger(
+            entity=args.wandb_entity, 
+            project=args.wandb_proj +'-'+ args.dataset_name, 
+            name=f'{args.model_name}-{run_time}',
+            save_dir=args.wandb_dir
+        )
+
+    if args.accelerator == 'cpu':
+        # Data-parallel CPU training: num_processes ranks per node, gradients all-reduced over gloo.
+        # The decoder layers keep an unused self_attn, so DDP has to look for unused parameters.
+        device_kwargs = dict(accelerator='cpu', devices=args.num_processes, num_nodes=args.num_nodes)
+        if args.num_processes * args.num_nodes > 1:
+            device_kwargs.update(strategy=DDPStrategy(process_group_backend='gloo', find_unused_parameters=True), use_distributed_sampler=False)
+    else:
+        device_kwargs = dict(devices=[args.gpu_num])
+
     trainer = pl.Trainer(
-        devices=[args.gpu_num],
+        **device_kwargs,
         max_epochs=args.num_epochs,
+        max_steps=args.max_steps,
         check_val_every_n_epoch=1,
-        logger=wandb_logger,
-        callbacks=[checkpoint_callback]
+        logger=logger,
+        callbacks=[checkpoint_callback, EpochTimer()]
     )
-    trainer.fit(model, datamodule=dataset)
-    print(checkpoint_callback.best_model_path)
+    if args.finetune_ckpt:
+        previous_score = trainer.validate(model, datamodule=dataset)[0]['valid_rescaled_adjusted_smape']
+    trainer.fit(model, datamodule=dataset, ckpt_path=args.resume_ckpt or None)
     ckpt_path = checkpoint_callback.best_model_path
-    trainer.test(model=model, ckpt_path=ckpt_path, datamodule=dataset)
-
-
-if __name__ == '__main__':
+    if args.finetune_ckpt:
+        # max_steps usually stops the fine-tune mid-epoch, after the last validation, so the final weights are validated
+        # here and checkpointed if they are the best ones
+        final_score = trainer.validate(model, datamodule=dataset)[0]['valid_rescaled_adjusted_smape']
+        if checkpoint_callback.best_model_score is None or final_score < checkpoint_callback.best_model_score.item():
+            ckpt_path = ckpt_path or os.path.join(checkpoint_callback.dirpath, checkpoint_callback.filename + checkpoint_callback.FILE_EXTENSION)
+            trainer.save_checkpoint(ckpt_path)
+            checkpoint_callback.best_model_path = ckpt_path
+            checkpoint_callback.best_model_score = torch.tensor(final_score)
+    print(checkpoint_callback.best_model_path)
+    if args.finetune_ckpt and checkpoint_callback.best_model_score.item() >= previous_score:
+        print(f"Fine-tuned valid_rescaled_adjusted_smape {checkpoint_callback.best_model_score.item():.4f} does not improve on "
+              f"{previous_score:.4f}, keeping {args.finetune_ckpt}")
+        # The rejected checkpoint is removed so the next refresh does not pick it up, and the returned
+        # callback points to the model that was actually kept
+        if trainer.is_global_zero and ckpt_path and os.path.exists(ckpt_path):
+            os.remove(ckpt_path)
+        checkpoint_callback.best_model_path = args.finetune_ckpt
+        checkpoint_callback.best_model_score = torch.tensor(previous_score)
+        model.load_state_dict(load_state_dict(args.finetune_ckpt))
+        ckpt_path = None
+    if test:
+        trainer.test(model=model, ckpt_path=ckpt_path, datamodule=dataset)
+    return checkpoint_callback
+
+
+def get_parser():
     parser = argparse.ArgumentParser(description='Multivariate-Time-Series-Forecasting')
     # General arguments
     parser.add_argument('--data_dir', type=str, default='/SSL_NAS/SFLAB/')
@@ -84,7 +156,18 @@ if __name__ == '__main__':
     parser.add_argument('--seed', type=int, default=21)
     parser.add_argument('--num_epochs', type=int, default=100)
     parser.add_argument('--gpu_num', type=int, default=1)
+    parser.add_argument('--accelerator', type=str, default='gpu', choices=['gpu', 'cpu'])
+    parser.add_argument('--num_processes', type=int, default=1)
+    parser.add_argument('--num_nodes', type=int, default=1)
     parser.add_argument('--learning_rate', type=float, default=0.0001)
+    parser.add_argument('--resume_ckpt', type=str, default='')
+    parser.add_argument('--save_last', action="store_true")
+    parser.add_argument('--max_steps', type=int, default=-1)
+
+    # Fine-tune arguments
+    parser.add_argument('--finetune_ckpt', type=str, default='')
+    parser.add_argument('--new_item_ids', type=str, default='', help="pickled list of new/changed training item ids")
+    parser.add_argument('--replay_ratio', type=float, default=0.1)
 
     parser.add_argument('--model_name', type=str, default='Transformer')
     parser.add_argument('--dataset_name', type=str, default='MindBridge')
@@ -106,10 +189,26 @@ if __name__ == '__main__':
     parser.add_argument('--num_exo_vars', type=int, default=48)
     parser.add_argument("--num_meta", type=int, default=52)
 
-    # wandb arguments
+    # Sharded dataset arguments
+    parser.add_argument('--shard_dir', type=str, default='')
+    parser.add_argument('--shard_size', type=int, default=4096)
+    parser.add_argument('--shuffle_buffer', type=int, default=4096)
+
+    # Embedding store arguments
+    parser.add_argument('--embedding_dir', type=str, default='')
+    parser.add_argument('--embedding_dtype', type=str, default='float32', choices=['float32', 'float16'])
+    parser.add_argument('--embedding_compression', type=str, default='none', choices=['none', 'int8', 'pca'])
+    parser.add_argument('--embedding_pca_dim', type=int, default=128)
+
+    # Logging arguments
+    parser.add_argument('--logger', type=str, default='wandb', choices=['wandb', 'local'])
     parser.add_argument('--wandb_entity', type=str, default='bonbak')
     parser.add_argument('--wandb_proj', type=str, default='Multivariate-Time-Series-Forecasting')
     parser.add_argument('--wandb_dir', type=str, default='/home/bonbak/MVTSF')
 
-    args = parser.parse_args()
+    return parser
+
+
+if __name__ == '__main__':
+    args = get_parser().parse_args()
     run(args)
\ No newline at end of file
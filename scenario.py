@@ -0,0 +1,136 @@
+import sys
+sys.path.append('../')
+
+import torch
+import argparse
+import numpy as np
+import random
+from torch.utils.data import DataLoader
+
+import urllib3
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+import os
+import importlib
+
+from MVTSF.util.checkpoint import load_model_from_checkpoint, copy_hparams
+from MVTSF.util.scenario import Scenario
+
+
+def random_seed(seed: int = 42):
+    random.seed(seed)
+    np.random.seed(seed)
+    os.environ["PYTHONHASHSEED"] = str(seed)
+    torch.manual_seed(seed)
+    torch.cuda.manual_seed(seed)
+    torch.backends.cudnn.deterministic = True
+    torch.backends.cudnn.benchmark = False
+
+def forecast_scenarios(model, dataloader, scenarios, scenario_batch_size):
+    # Models with cached decoding compute the item-side query embedding once per batch and decode it against the
+    # exogenous encoding of every scenario. The others (TimeXer, whose decoder queries depend on the endogenous
+    # encoder, or the distilled Student) run a full forward pass over the scenario-expanded batch.
+    # Either way scenario_batch_size scenarios are forecast per forward pass.
+    cached = getattr(model, 'cached_decoding', False)
+    forecasts = []
+    with torch.no_grad():
+        for batch in dataloader:
+            item_sales, endo_inputs, exo_inputs, release_dates, image_embeddings, text_embeddings, meta_data = batch
+            if cached:
+                query = model.encode_query(release_dates, image_embeddings, text_embeddings, meta_data)
+            batch_forecasts = []
+            for i in range(0, len(scenarios), scenario_batch_size):
+                chunk = scenarios[i:i+scenario_batch_size]
+                scenario_exo_inputs = torch.cat([scenario(exo_inputs) for scenario in chunk], dim=0)
+                if cached:
+                    forecast, _ = model.decode_memory(query.repeat(len(chunk), 1), model.encode_memory(scenario_exo_inputs))
+                    forecast = torch.clamp(model.denormalize(forecast), min=0)
+                else:
+                    expanded = [x.repeat(len(chunk), *[1] * (x.dim() - 1)) for x in batch]
+                    expanded[2] = scenario_exo_inputs
+                    forecast = model.phase_step(expanded, phase='predict')
+                batch_forecasts.append(forecast.reshape(len(chunk), len(item_sales), -1))
+            forecasts.append(torch.cat(batch_forecasts, dim=0))
+    # (num_scenarios, num_items, output_len)
+    return torch.cat(forecasts, dim=1).numpy().astype(np.float32)
+
+def run(args):
+    args.data_dir = args.data_dir + f"/{args.dataset_name}"
+    args.log_dir = args.log_dir + f"/{args.dataset_name}"
+    args.result_dir = args.result_dir + f"/{args.dataset_name}"
+
+    # The model is rebuilt from the args it was trained with, and the datamodule serves the inputs it was trained on
+    ckpt_path = os.path.join(args.log_dir, args.model_name, args.ckpt_name)
+    model, model_args = load_model_from_checkpoint(ckpt_path)
+    copy_hparams(args, model_args)
+
+    print(args)
+    random_seed(args.seed)
+
+    dataset_module = importlib.import_module("MVTSF.util.datamodule")
+    dataset_cls = getattr(dataset_module, f"{args.dataset_name}DataModule")
+    dataset = dataset_cls(args)
+    dataset.prepare_data()
+    dataset.setup("predict")
+
+    scenarios = [Scenario('baseline')] + [Scenario(spec) for spec in args.scenarios]
+    dataloader = DataLoader(dataset.test_dataset, batch_size=args.batch_size, shuffle=False)
+    forecasts = forecast_scenarios(model, dataloader, scenarios, args.scenario_batch_size)
+
+    ckpt_stem, ckpt_ext = os.path.splitext(args.ckpt_name)
+    result_name = ckpt_stem if ckpt_ext == ".ckpt" else f"{ckpt_stem}-{ckpt_ext.lstrip('.')}"
+    os.makedirs(args.result_dir, exist_ok=True)
+    np.savez(
+        os.path.join(args.result_dir, f"{result_name}-scenario.npz"),
+        forecast=forecasts,
+        item_ids=np.array(dataset.test_dataset.item_ids),
+        scenarios=np.array([scenario.name for scenario in scenarios]),
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Multivariate-Time-Series-Forecasting')
+    # General arguments
+    parser.add_argument('--data_dir', type=str, default='/SSL_NAS/SFLAB/')
+    parser.add_argument('--log_dir', type=str, default='log')
+    parser.add_argument('--result_dir', type=str, default='result')
+    parser.add_argument('--seed', type=int, default=21)
+    parser.add_argument('--learning_rate', type=float, default=0.0001)
+
+    parser.add_argument('--model_name', type=str, default='Transformer')
+    parser.add_argument('--dataset_name', type=str, default='MindBridge')
+    parser.add_argument('--ckpt_name', type=str, default='')
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--input_dim', type=int, default=512)
+    parser.add_argument('--output_dim', type=int, default=512)
+    parser.add_argument('--endo_input_len', type=int, default=12)
+    parser.add_argument('--exo_input_len', type=int, default=52)
+    parser.add_argument('--output_len', type=int, default=12)
+    parser.add_argument('--num_heads', type=int, default=8)
+    parser.add_argument('--num_layers', type=int, default=2)
+
+    # Specific arguments
+    parser.add_argument("--use_trend", action="store_true")
+    parser.add_argument("--use_weather", action="store_true")
+    parser.add_argument("--use_meta_sale", action="store_true")
+    parser.add_argument('--segment_len', type=int, default=4)
+    parser.add_argument('--num_endo_vars', type=int, default=4)
+    parser.add_argument('--num_exo_vars', type=int, default=48)
+    parser.add_argument("--num_meta", type=int, default=52)
+
+    # Sharded dataset arguments
+    parser.add_argument('--shard_dir', type=str, default='')
+    parser.add_argument('--shard_size', type=int, default=4096)
+    parser.add_argument('--shuffle_buffer', type=int, default=4096)
+
+    # Embedding store arguments
+    parser.add_argument('--embedding_dir', type=str, default='')
+    parser.add_argument('--embedding_dtype', type=str, default='float32', choices=['float32', 'float16'])
+    parser.add_argument('--embedding_compression', type=str, default='none', choices=['none', 'int8', 'pca'])
+    parser.add_argument('--embedding_pca_dim', type=int, default=128)
+
+    # Scenario arguments
+    parser.add_argument('--scenarios', type=str, nargs='+', default=[], help="op:vars:value with op in scale/shift/set, e.g. scale:0,1:1.1")
+    parser.add_argument('--scenario_batch_size', type=int, default=8)
+
+    args = parser.parse_args()
+    run(args)
@@ -0,0 +1,16 @@
+dataset_name=MindBridge
+teacher_ckpt=log/MindBridge/Transformer/Transformer-250312-1534.ckpt
+exo_input_len=52
+num_meta=52
+num_exo_vars=9
+
+python -u distill.py \
+    --dataset_name $dataset_name \
+    --teacher_ckpt $teacher_ckpt \
+    --exo_input_len $exo_input_len \
+    --num_meta $num_meta \
+    --num_exo_vars $num_exo_vars \
+    --num_epochs 50 \
+    --learning_rate 0.001 \
+    --student_hidden_dim 256 \
+    --distill_alpha 0.5
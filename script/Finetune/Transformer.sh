@@ -0,0 +1,18 @@
+dataset_name=MindBridge
+finetune_ckpt=log/MindBridge/Transformer/Transformer-250312-1534.ckpt
+new_item_ids=/SSL_NAS/SFLAB/MindBridge/new_item_ids.pkl
+exo_input_len=52
+num_meta=52
+num_exo_vars=9
+
+python -u run.py \
+    --dataset_name $dataset_name \
+    --finetune_ckpt $finetune_ckpt \
+    --new_item_ids $new_item_ids \
+    --replay_ratio 0.1 \
+    --exo_input_len $exo_input_len \
+    --num_meta $num_meta \
+    --num_exo_vars $num_exo_vars \
+    --num_epochs 100 \
+    --max_steps 500 \
+    --learning_rate 0.00005
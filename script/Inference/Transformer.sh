@@ -16,5 +16,6 @@ python -u inference.py \
     --num_meta $num_meta \
     --num_exo_vars $num_exo_vars \
     --use_trend \
+    --export_csv \
     # --use_meta_sale \
     # --use_weather \
\ No newline at end of file
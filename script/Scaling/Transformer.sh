@@ -0,0 +1,22 @@
+model_name=Transformer
+dataset_name=MindBridge
+exo_input_len=52
+num_meta=52
+num_exo_vars=9
+num_epochs=3
+
+# Epoch time versus number of gloo DDP processes on one CPU host.
+# For several hosts, set MASTER_ADDR, MASTER_PORT and NODE_RANK on every host and pass --num_nodes.
+for num_processes in 1 2 4 8
+    do
+        python -u run.py \
+        --model_name $model_name \
+        --dataset_name $dataset_name \
+        --accelerator cpu \
+        --num_processes $num_processes \
+        --num_epochs $num_epochs \
+        --exo_input_len $exo_input_len \
+        --num_meta $num_meta \
+        --num_exo_vars $num_exo_vars \
+        | grep epoch_time
+    done
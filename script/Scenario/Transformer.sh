@@ -0,0 +1,16 @@
+model_name=Transformer
+dataset_name=MindBridge
+ckpt_name=Transformer-250312-1534.ckpt
+exo_input_len=52
+num_meta=52
+num_exo_vars=3
+
+
+python -u scenario.py \
+    --model_name $model_name \
+    --dataset_name $dataset_name \
+    --ckpt_name $ckpt_name \
+    --exo_input_len $exo_input_len \
+    --num_meta $num_meta \
+    --num_exo_vars $num_exo_vars \
+    --scenarios scale:0:1.1 scale:0:0.9 scale:all:1.1 scale:all:0.9
@@ -0,0 +1,19 @@
+model_name=Transformer
+dataset_name=MindBridge
+exo_input_len=52
+num_meta=52
+num_exo_vars=9
+
+python -u search.py \
+    --model_name $model_name \
+    --dataset_name $dataset_name \
+    --accelerator cpu \
+    --exo_input_len $exo_input_len \
+    --num_meta $num_meta \
+    --num_exo_vars $num_exo_vars \
+    --search_dir log/search/$dataset_name-$model_name \
+    --num_trials 27 \
+    --num_workers 4 \
+    --min_epochs 4 \
+    --num_epochs 100 \
+    --eta 3
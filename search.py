@@ -0,0 +1,118 @@
+import sys
+sys.path.append('../')
+
+import os
+import csv
+import copy
+import math
+import random
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+from MVTSF.run import run, get_parser
+
+
+# Preprocessed once in the parent and inherited by the forked trial workers
+DATASET = None
+
+
+def init_worker(num_threads):
+    torch.set_num_threads(num_threads)
+
+def run_trial(trial_args):
+    checkpoint_callback = run(trial_args, dataset=DATASET, test=False)
+    return checkpoint_callback.best_model_score.item()
+
+def sample_trials(args):
+    rng = random.Random(args.seed)
+    low, high = math.log(args.search_learning_rate[0]), math.log(args.search_learning_rate[-1])
+    trials = []
+    for trial_id in range(args.num_trials):
+        trials.append({
+            'trial': trial_id,
+            'output_dim': rng.choice(args.search_output_dim),
+            'num_layers': rng.choice(args.search_num_layers),
+            'num_heads': rng.choice(args.search_num_heads),
+            'segment_len': rng.choice(args.search_segment_len),
+            'learning_rate': math.exp(rng.uniform(low, high)),
+        })
+    return trials
+
+def trial_args(args, trial, num_epochs):
+    trial_args = copy.deepcopy(args)
+    for k, v in trial.items():
+        if k in ['output_dim', 'num_layers', 'num_heads', 'segment_len', 'learning_rate']:
+            setattr(trial_args, k, v)
+    trial_args.num_epochs = num_epochs
+    trial_args.log_dir = os.path.join(args.search_dir, f"trial-{trial['trial']:03d}")
+    trial_args.save_last = True
+    # Continue from the previous rung instead of training the survivors from scratch
+    last_ckpt = os.path.join(trial_args.log_dir, args.dataset_name, args.model_name, "last.ckpt")
+    trial_args.resume_ckpt = last_ckpt if os.path.exists(last_ckpt) else ''
+    return trial_args
+
+def write_leaderboard(path, results):
+    fields = ['trial', 'rung', 'num_epochs', 'valid_rescaled_adjusted_smape', 'output_dim', 'num_layers', 'num_heads', 'segment_len', 'learning_rate']
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for result in sorted(results, key=lambda r: (-r['rung'], r['valid_rescaled_adjusted_smape'])):
+            writer.writerow({k: result[k] for k in fields})
+
+def search(args):
+    # Successive halving: every rung trains the surviving trials up to min_epochs * eta^rung epochs
+    # (resuming from their last checkpoint), then keeps the best 1/eta by valid_rescaled_adjusted_smape.
+    global DATASET
+    dataset_args = copy.deepcopy(args)
+    dataset_args.data_dir = args.data_dir + f"/{args.dataset_name}"
+    dataset_module = importlib.import_module("MVTSF.util.datamodule")
+    DATASET = getattr(dataset_module, f"{args.dataset_name}DataModule")(dataset_args)
+    DATASET.prepare_data()
+    DATASET.setup("fit")
+    # The datamodule sets use_trend/use_weather/use_meta_sale from num_exo_vars
+    for k in ['use_trend', 'use_weather', 'use_meta_sale']:
+        setattr(args, k, getattr(dataset_args, k))
+
+    os.makedirs(args.search_dir, exist_ok=True)
+    trials = sample_trials(args)
+    results = []
+    num_threads = max(1, (os.cpu_count() or 1) // args.num_workers)
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(args.num_workers, mp_context=context, initializer=init_worker, initargs=(num_threads,)) as pool:
+        rung, num_epochs = 0, args.min_epochs
+        while True:
+            num_epochs = min(num_epochs, args.num_epochs)
+            scores = list(pool.map(run_trial, [trial_args(args, trial, num_epochs) for trial in trials]))
+            for trial, score in zip(trials, scores):
+                results.append(dict(trial, rung=rung, num_epochs=num_epochs, valid_rescaled_adjusted_smape=score))
+            write_leaderboard(os.path.join(args.search_dir, "leaderboard.csv"), results)
+
+            if num_epochs >= args.num_epochs or len(trials) <= 1:
+                break
+            ranked = sorted(zip(scores, range(len(trials))))
+            trials = [trials[i] for _, i in ranked[:max(1, len(trials) // args.eta)]]
+            rung, num_epochs = rung + 1, num_epochs * args.eta
+
+    best = min((r for r in results if r['rung'] == rung), key=lambda r: r['valid_rescaled_adjusted_smape'])
+    print(best)
+    return best
+
+
+if __name__ == '__main__':
+    parser = get_parser()
+    parser.add_argument('--search_dir', type=str, default='log/search')
+    parser.add_argument('--num_trials', type=int, default=27)
+    parser.add_argument('--num_workers', type=int, default=4)
+    parser.add_argument('--min_epochs', type=int, default=4)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--search_output_dim', type=int, nargs='+', default=[128, 256, 512])
+    parser.add_argument('--search_num_layers', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--search_num_heads', type=int, nargs='+', default=[4, 8])
+    parser.add_argument('--search_segment_len', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--search_learning_rate', type=float, nargs=2, default=[1e-5, 1e-3], help="log-uniform range")
+
+    args = parser.parse_args()
+    search(args)
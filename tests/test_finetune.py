@@ -0,0 +1,89 @@
+import os
+import sys
+# Like the entry scripts, which run from the repository root with sys.path.append('../')
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.extend([ROOT_DIR, os.path.join(ROOT_DIR, '..')])
+
+import json
+import pickle
+import numpy as np
+import pytest
+
+from MVTSF.run import run, get_parser, finetune_item_ids
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    # Small synthetic MindBridge dataset: 40 train, 10 valid and 10 test items
+    data_dir = tmp_path_factory.mktemp("data")
+    os.makedirs(data_dir / "MindBridge")
+    rng = np.random.default_rng(0)
+    item_ids = [f"item{i}" for i in range(60)]
+    data = {item_id: {
+        'item_sales': rng.poisson(40, 12).tolist(),
+        'release_date': rng.random(4).tolist(),
+        'meta_data': rng.random(52).tolist(),
+        'trend': rng.random((3, 52)).tolist(),
+        'endo_vars': rng.random(12).tolist(),
+    } for item_id in item_ids}
+    json.dump(data, open(data_dir / "MindBridge" / "data.json", "w"))
+    for name in ["fclip_image", "fclip_text"]:
+        pickle.dump({item_id: rng.normal(size=512).tolist() for item_id in item_ids}, open(data_dir / "MindBridge" / f"{name}.pkl", "wb"))
+    for split, split_item_ids in [('train', item_ids[:40]), ('valid', item_ids[40:50]), ('test', item_ids[50:])]:
+        pickle.dump(split_item_ids, open(data_dir / "MindBridge" / f"{split}_item_ids.pkl", "wb"))
+    return data_dir
+
+def get_args(data_dir, log_dir, *extra):
+    return get_parser().parse_args([
+        '--data_dir', str(data_dir), '--log_dir', str(log_dir), '--accelerator', 'cpu', '--logger', 'local',
+        '--num_exo_vars', '3', '--output_dim', '32', '--num_heads', '4', '--num_layers', '1', '--batch_size', '8',
+        *extra
+    ])
+
+@pytest.fixture(scope="module")
+def base_ckpt(data_dir, tmp_path_factory):
+    log_dir = tmp_path_factory.mktemp("log")
+    os.environ["MVTSF_RUN_TIME"] = "base"
+    checkpoint_callback = run(get_args(data_dir, log_dir, '--num_epochs', '1'), test=False)
+    return log_dir, checkpoint_callback.best_model_path
+
+
+def test_finetune_item_ids_excludes_eval_items(data_dir):
+    new_item_ids_path = data_dir / "new_item_ids.pkl"
+    # item45 is a valid item and item55 a test item
+    pickle.dump(['item1', 'item45', 'item55'], open(new_item_ids_path, "wb"))
+    args = get_args(data_dir, data_dir, '--new_item_ids', str(new_item_ids_path), '--replay_ratio', '0.1')
+    train_item_ids = [f"item{i}" for i in range(40)]
+
+    item_ids = finetune_item_ids(train_item_ids, args)
+
+    assert item_ids[0] == 'item1'
+    assert 'item45' not in item_ids and 'item55' not in item_ids
+    assert len(item_ids) == 1 + int(39 * 0.1)
+    assert set(item_ids) <= set(train_item_ids)
+
+def test_finetune_validates_final_weights_when_epoch_limit_is_reached_first(data_dir, base_ckpt, monkeypatch, capsys):
+    log_dir, ckpt_path = base_ckpt
+    monkeypatch.setenv("MVTSF_RUN_TIME", "finetune")
+    # 5 steps per epoch, num_epochs ends training long before max_steps
+    args = get_args(data_dir, log_dir, '--finetune_ckpt', ckpt_path, '--max_steps', '500', '--num_epochs', '1')
+
+    checkpoint_callback = run(args, test=False)
+
+    # Without a validation of the fine-tuned weights the comparison used to report nan and keep the old model
+    assert "nan does not improve" not in capsys.readouterr().out
+    assert np.isfinite(checkpoint_callback.best_model_score.item())
+    assert os.path.exists(checkpoint_callback.best_model_path)
+
+def test_finetune_validates_final_weights_when_max_steps_stops_mid_epoch(data_dir, base_ckpt, monkeypatch):
+    log_dir, ckpt_path = base_ckpt
+    monkeypatch.setenv("MVTSF_RUN_TIME", "finetune-steps")
+    args = get_args(data_dir, log_dir, '--finetune_ckpt', ckpt_path, '--max_steps', '2', '--num_epochs', '100')
+
+    checkpoint_callback = run(args, test=False)
+
+    assert checkpoint_callback.best_model_score is not None
+    assert os.path.exists(checkpoint_callback.best_model_path)
+    # A rejected fine-tune leaves no checkpoint of its own behind
+    if checkpoint_callback.best_model_path == ckpt_path:
+        assert not os.path.exists(os.path.join(os.path.dirname(ckpt_path), "Transformer-finetune-steps.ckpt"))
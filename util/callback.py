@@ -0,0 +1,24 @@
+import time
+import pytorch_lightning as pl
+
+
+class EpochTimer(pl.Callback):
+    # Logs the wall-clock time of every training epoch as epoch_time and prints it from rank zero
+    def on_train_epoch_start(self, trainer, pl_module):
+        self.start_time = time.perf_counter()
+
+    def on_train_epoch_end(self, trainer, pl_module):
+        epoch_time = time.perf_counter() - self.start_time
+        pl_module.log('epoch_time', epoch_time, on_step=False, on_epoch=True, sync_dist=True, reduce_fx='max')
+        if trainer.is_global_zero:
+            print(f"epoch {trainer.current_epoch} world_size {trainer.world_size} epoch_time {epoch_time:.3f}")
+
+
+class PredictionWriter(pl.callbacks.BasePredictionWriter):
+    # Hands every predicted batch to a ResultWriter, which itself does not depend on Lightning
+    def __init__(self, result_writer):
+        super().__init__(write_interval="batch")
+        self.result_writer = result_writer
+
+    def write_on_batch_end(self, trainer, pl_module, prediction, batch_indices, batch, batch_idx, dataloader_idx):
+        self.result_writer.write_batch(prediction, trainer.datamodule.test_dataset.item_ids)
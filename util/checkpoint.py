@@ -0,0 +1,80 @@
+import os
+import json
+import argparse
+import importlib
+import torch
+
+
+def build_model(args):
+    model_module = importlib.import_module(f"MVTSF.model.{args.model_name}")
+    model_cls = getattr(model_module, args.model_name)
+    return model_cls(args)
+
+def load_model_from_checkpoint(ckpt_path):
+    # Rebuilds the model from the args it was trained with, as saved by save_hyperparameters,
+    # or from the JSON sidecar of weights exported by export.py
+    if os.path.splitext(ckpt_path)[1] in [".safetensors", ".pt"]:
+        args = load_hparams(argparse.Namespace(), ckpt_path)
+        return load_exported_model(args, ckpt_path), args
+    # Lightning checkpoints pickle the argparse namespace in their hyperparameters
+    checkpoint = torch.load(ckpt_path, map_location='cpu', weights_only=False)
+    args = checkpoint['hyper_parameters']['args']
+    model = build_model(args)
+    model.load_state_dict(checkpoint['state_dict'])
+    return model.eval(), args
+
+# Hyperparameters copied from a checkpoint or the JSON sidecar of exported weights onto the args of an entry point
+MODEL_HPARAMS = [
+    'model_name', 'input_dim', 'output_dim', 'endo_input_len', 'exo_input_len', 'output_len', 'num_heads',
+    'num_layers', 'segment_len', 'num_endo_vars', 'num_exo_vars', 'num_meta', 'center', 'scale',
+    'learning_rate', 'student_hidden_dim', 'distill_alpha',
+]
+
+
+def sidecar_path(weights_path):
+    return os.path.splitext(weights_path)[0] + ".json"
+
+def export_weights(ckpt_path, weights_path):
+    # Writes the state dict as safetensors (or a plain torch file when safetensors is not installed)
+    # next to a JSON sidecar with the training args, so inference needs neither pickle nor Lightning state.
+    checkpoint = torch.load(ckpt_path, map_location='cpu', weights_only=False)
+    # Cloned because safetensors refuses tensors shared between keys (TimeXer repeats its encoder modules)
+    state_dict = {k: v.clone().contiguous() for k, v in checkpoint['state_dict'].items()}
+    if weights_path.endswith(".safetensors"):
+        from safetensors.torch import save_file
+        save_file(state_dict, weights_path)
+    else:
+        torch.save(state_dict, weights_path)
+
+    hparams = {k: v for k, v in vars(checkpoint['hyper_parameters']['args']).items() if isinstance(v, (int, float, str, bool, list))}
+    json.dump(hparams, open(sidecar_path(weights_path), "w"), indent=2)
+
+def load_hparams(args, weights_path):
+    hparams = json.load(open(sidecar_path(weights_path), "r"))
+    return copy_hparams(args, hparams)
+
+def copy_hparams(args, hparams):
+    if isinstance(hparams, argparse.Namespace):
+        hparams = vars(hparams)
+    for k in MODEL_HPARAMS:
+        if k in hparams:
+            setattr(args, k, hparams[k])
+    return args
+
+def load_weights(weights_path):
+    # Both formats are memory-mapped, tensors are backed by the file instead of being copied into memory
+    if weights_path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        return load_file(weights_path)
+    return torch.load(weights_path, map_location='cpu', mmap=True, weights_only=True)
+
+def load_exported_model(args, weights_path):
+    model = build_model(args)
+    model.load_state_dict(load_weights(weights_path), assign=True)
+    return model.eval()
+
+def load_state_dict(path):
+    # Accepts both Lightning checkpoints and weights exported by export.py
+    if os.path.splitext(path)[1] in [".safetensors", ".pt"]:
+        return load_weights(path)
+    return torch.load(path, map_location='cpu', weights_only=False)['state_dict']
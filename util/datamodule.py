@@ -4,10 +4,12 @@ from torch.utils.data import Dataset
 import torch
 from tqdm import tqdm
 import numpy as np
-import pandas as pd
 import os
 import pickle
 import json
+
+from MVTSF.util.embedding import EmbeddingStore
+from MVTSF.util.shard import ShardedDataset, write_shards, shards_up_to_date
     
 
 class BasicDataModule(pl.LightningDataModule):
@@ -16,35 +18,103 @@ class BasicDataModule(pl.LightningDataModule):
         self.args = args
         self.data_dir = args.data_dir
         self.batch_size = args.batch_size
+        self.shard_dir = args.shard_dir
         self.train_item_ids = pickle.load(open(os.path.join(args.data_dir, 'train_item_ids.pkl'), 'rb'))
         self.valid_item_ids = pickle.load(open(os.path.join(args.data_dir, 'valid_item_ids.pkl'), 'rb'))
         self.test_item_ids = pickle.load(open(os.path.join(args.data_dir, 'test_item_ids.pkl'), 'rb'))
     
     def prepare_data(self):
+        # A datamodule shared by several fits (e.g. search.py trials) only loads and preprocesses once
+        if hasattr(self, 'data_dict'):
+            return
+        if self.shard_dir and shards_up_to_date(self.shard_dir, self.source_paths(), self.shard_build_params()):
+            return
+
+        self.load_data()
+
+        if self.shard_dir:
+            split_item_ids = {'train': self.train_item_ids, 'valid': self.valid_item_ids, 'test': self.test_item_ids}
+            write_shards(self.data_dict, split_item_ids, self.shard_dir, self.args.shard_size, self.source_paths(), self.shard_build_params())
+            del self.data_dict
+
+    def source_paths(self):
+        return [os.path.join(self.data_dir, name) for name in
+                ["data.json", "fclip_image.pkl", "fclip_text.pkl", "train_item_ids.pkl", "valid_item_ids.pkl", "test_item_ids.pkl"]]
+
+    def shard_build_params(self):
+        return {k: getattr(self.args, k) for k in ['shard_size', 'embedding_dtype', 'embedding_compression', 'embedding_pca_dim']}
+
+    def load_data(self):
         self.data_dict = json.load(open(os.path.join(self.data_dir, "data.json"), "r"))
-        self.data_dict['image_embedding'] = pickle.load(open(os.path.join(self.data_dir, "fclip_image.pkl"), "rb"))
-        self.data_dict['text_embedding'] = pickle.load(open(os.path.join(self.data_dir, "fclip_text.pkl"), "rb"))
+        self.data_dict['image_embedding'] = self.load_embedding_store("fclip_image")
+        self.data_dict['text_embedding'] = self.load_embedding_store("fclip_text")
+
+    def load_embedding_store(self, name):
+        # Namespaced like data_dir and log_dir, so datasets sharing one --embedding_dir keep separate stores
+        store_dir = os.path.join(self.args.embedding_dir, self.args.dataset_name, name) if self.args.embedding_dir else ''
+        return EmbeddingStore.from_pickle(
+            os.path.join(self.data_dir, f"{name}.pkl"),
+            store_dir,
+            dtype=self.args.embedding_dtype,
+            compression=self.args.embedding_compression,
+            pca_dim=self.args.embedding_pca_dim,
+        )
 
     def setup(self, stage: str):
-        if stage == "fit":
-            self.train_dataset = BasicDataset(self.args, self.data_dict, self.train_item_ids)
-            self.valid_dataset = BasicDataset(self.args, self.data_dict, self.valid_item_ids)
+        if self.shard_dir:
+            self.setup_shards(stage)
+            return
+
+        # prepare_data only runs on one process per node, the other DDP ranks load the data here
+        if not hasattr(self, 'data_dict'):
+            self.load_data()
+
+        if stage == "fit" and not hasattr(self, 'train_dataset'):
+            self.train_dataset = BasicDataset(self.args, self.data_dict, self.rank_item_ids(self.train_item_ids, equal_size=True))
+        if stage in ["fit", "validate"] and not hasattr(self, 'valid_dataset'):
+            self.valid_dataset = BasicDataset(self.args, self.data_dict, self.rank_item_ids(self.valid_item_ids))
         if stage == "test":
-            self.test_dataset = BasicDataset(self.args, self.data_dict, self.test_item_ids)
+            self.test_dataset = BasicDataset(self.args, self.data_dict, self.rank_item_ids(self.test_item_ids))
         if stage == "predict":
             self.test_dataset = BasicDataset(self.args, self.data_dict, self.test_item_ids)
 
+    def setup_shards(self, stage: str):
+        if stage == "fit" and not hasattr(self, 'train_dataset'):
+            self.train_dataset = ShardedDataset(self.args, self.shard_dir, 'train', self.rank_item_ids(self.train_item_ids, equal_size=True), shuffle=True, buffer_size=self.args.shuffle_buffer)
+        if stage in ["fit", "validate"] and not hasattr(self, 'valid_dataset'):
+            self.valid_dataset = ShardedDataset(self.args, self.shard_dir, 'valid', self.rank_item_ids(self.valid_item_ids))
+        if stage == "test":
+            self.test_dataset = ShardedDataset(self.args, self.shard_dir, 'test', self.rank_item_ids(self.test_item_ids))
+        if stage == "predict":
+            self.test_dataset = ShardedDataset(self.args, self.shard_dir, 'test', self.test_item_ids)
+
+    def rank_item_ids(self, item_ids, equal_size=False):
+        # Under DDP every rank keeps every world_size-th item. Training splits are padded to a multiple of world_size
+        # with items from the head, like DistributedSampler, because all ranks have to run the same number of steps
+        # to stay in sync on the gradient all-reduce.
+        if self.trainer is None or self.trainer.world_size == 1:
+            return item_ids
+        world_size, rank = self.trainer.world_size, self.trainer.global_rank
+        if equal_size:
+            num_padding = -len(item_ids) % world_size
+            item_ids = list(item_ids) + (list(item_ids) * world_size)[:num_padding]
+        return item_ids[rank::world_size]
+
+    def eval_batch_size(self, dataset):
+        # Streaming evaluation keeps memory bounded, in-memory splits are evaluated in one batch
+        return self.batch_size if self.shard_dir else len(dataset)
+
     def train_dataloader(self):
         return DataLoader(self.train_dataset, batch_size=self.batch_size)
 
     def val_dataloader(self):
-        return DataLoader(self.valid_dataset, batch_size=len(self.valid_dataset), shuffle=False)
+        return DataLoader(self.valid_dataset, batch_size=self.eval_batch_size(self.valid_dataset), shuffle=False)
 
     def test_dataloader(self):
-        return DataLoader(self.test_dataset, batch_size=len(self.test_dataset), shuffle=False)
+        return DataLoader(self.test_dataset, batch_size=self.eval_batch_size(self.test_dataset), shuffle=False)
 
     def predict_dataloader(self):
-        return DataLoader(self.test_dataset, batch_size=len(self.test_dataset), shuffle=False)
+        return DataLoader(self.test_dataset, batch_size=self.batch_size, shuffle=False)
     
 
 class BasicDataset(Dataset):
@@ -55,16 +125,17 @@ class BasicDataset(Dataset):
         self.use_meta_sale = args.use_meta_sale
         self.data_dict = data_dict
         self.item_ids = item_ids
+        # Embeddings stay in the shared EmbeddingStore and are looked up per item instead of copied per split
+        self.image_store = data_dict['image_embedding']
+        self.text_store = data_dict['text_embedding']
         self.__preprocess__()
 
     def __preprocess__(self):
-        item_ids, item_sales, endo_inputs, exo_inputs, release_dates, image_embeddings, text_embeddings, meta_data  = [[] for _ in range(8)]
+        item_ids, item_sales, endo_inputs, exo_inputs, release_dates, meta_data  = [[] for _ in range(6)]
 
         for item_id in tqdm(self.item_ids, total=len(self.item_ids), ascii=True):
             sales = self.data_dict[item_id]['item_sales']
             release_date = self.data_dict[item_id]['release_date']
-            img_emb = self.data_dict['image_embedding'][item_id] if item_id in self.data_dict['image_embedding'] else np.random.normal(size=512).tolist()
-            txt_emb = self.data_dict['text_embedding'][item_id] if item_id in self.data_dict['text_embedding'] else np.random.normal(size=512).tolist()
             meta = self.data_dict[item_id]['meta_data']
             
             exo = []
@@ -76,8 +147,6 @@ class BasicDataset(Dataset):
             
             item_sales.append(sales)
             release_dates.append(release_date)
-            image_embeddings.append(img_emb)
-            text_embeddings.append(txt_emb)
             meta_data.append(meta)
             endo_inputs.append(endo)
             exo_inputs.append(exo)
@@ -88,8 +157,6 @@ class BasicDataset(Dataset):
         self.endo_inputs = torch.FloatTensor(np.array(endo_inputs))
         self.exo_inputs = torch.FloatTensor(np.array(exo_inputs))
         self.release_dates = torch.FloatTensor(np.array(release_dates))
-        self.image_embeddings = torch.FloatTensor(np.array(image_embeddings))
-        self.text_embeddings = torch.FloatTensor(np.array(text_embeddings))
         self.meta_data = torch.FloatTensor(np.array(meta_data))
     
     def __getitem__(self, idx):
@@ -98,8 +165,8 @@ class BasicDataset(Dataset):
             self.endo_inputs[idx],\
             self.exo_inputs[idx],\
             self.release_dates[idx],\
-            self.image_embeddings[idx],\
-            self.text_embeddings[idx],\
+            torch.from_numpy(self.image_store[self.item_ids[idx]]),\
+            torch.from_numpy(self.text_store[self.item_ids[idx]]),\
             self.meta_data[idx], \
 
     def __len__(self):
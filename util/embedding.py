@@ -0,0 +1,147 @@
+import os
+import json
+import zlib
+import pickle
+import numpy as np
+
+
+class EmbeddingStore:
+    # Dense (num_items, dim) embedding matrix with an item_id -> row index, shared by every split.
+    # Saved stores are memory-mapped, so DataLoader workers and processes share one copy through the page cache.
+    # compression='int8' keeps per-row absmax-quantized codes, compression='pca' keeps pca_dim principal
+    # components per row; both are decoded back to float32 of the original dimension on lookup.
+    def __init__(self, item_ids, matrix, compression='none', scale=None, components=None, mean=None):
+        self.item_ids = list(item_ids)
+        self.index = {item_id: row for row, item_id in enumerate(self.item_ids)}
+        self.matrix = matrix
+        self.compression = compression
+        self.scale = scale
+        self.components = components
+        self.mean = mean
+        self.dim = matrix.shape[1] if components is None else components.shape[1]
+
+    @classmethod
+    def build(cls, embedding_dict, dtype='float32', compression='none', pca_dim=128):
+        item_ids = list(embedding_dict.keys())
+        matrix = np.array([embedding_dict[item_id] for item_id in item_ids], dtype=np.float32)
+
+        if compression == 'none':
+            return cls(item_ids, matrix.astype(dtype))
+        if compression == 'int8':
+            scale = np.abs(matrix).max(axis=1, keepdims=True) / 127.0
+            scale[scale == 0] = 1.0
+            codes = np.round(matrix / scale).astype(np.int8)
+            return cls(item_ids, codes, compression, scale=scale.astype(np.float32))
+        if compression == 'pca':
+            mean = matrix.mean(axis=0)
+            centered = matrix - mean
+            # Eigendecomposition of the (dim, dim) covariance instead of an SVD of the full matrix
+            _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+            components = eigenvectors[:, ::-1][:, :pca_dim].T.copy()
+            return cls(item_ids, (centered @ components.T).astype(dtype), compression, components=components, mean=mean)
+        raise ValueError(f"Unknown embedding compression '{compression}', expected one of ['none', 'int8', 'pca']")
+
+    @classmethod
+    def from_pickle(cls, pkl_path, store_dir='', dtype='float32', compression='none', pca_dim=128):
+        # Builds the store from a {item_id: list} pickle once and reuses the saved store afterwards,
+        # as long as it was built from the same pickle (mtime and size) with the same parameters
+        build_params = {'source': [os.path.getmtime(pkl_path), os.path.getsize(pkl_path)],
+                        'dtype': dtype, 'compression': compression, 'pca_dim': pca_dim}
+        index_path = os.path.join(store_dir, "index.json")
+        if store_dir and os.path.exists(index_path) and json.load(open(index_path, "r")).get('build_params') == build_params:
+            return cls.load(store_dir)
+        store = cls.build(pickle.load(open(pkl_path, "rb")), dtype, compression, pca_dim)
+        if store_dir:
+            store.save(store_dir, build_params)
+            store = cls.load(store_dir)
+        return store
+
+    def save(self, store_dir, build_params=None):
+        os.makedirs(store_dir, exist_ok=True)
+        np.save(os.path.join(store_dir, "matrix.npy"), self.matrix)
+        for name in ['scale', 'components', 'mean']:
+            path = os.path.join(store_dir, f"{name}.npy")
+            if getattr(self, name) is not None:
+                np.save(path, getattr(self, name))
+            elif os.path.exists(path):
+                # Left over from a store previously saved here with another compression
+                os.remove(path)
+        index = {'item_ids': self.item_ids, 'compression': self.compression, 'build_params': build_params}
+        json.dump(index, open(os.path.join(store_dir, "index.json"), "w"))
+
+    @classmethod
+    def load(cls, store_dir):
+        index = json.load(open(os.path.join(store_dir, "index.json"), "r"))
+        matrix = np.load(os.path.join(store_dir, "matrix.npy"), mmap_mode='r')
+        extra = {}
+        for name in ['scale', 'components', 'mean']:
+            path = os.path.join(store_dir, f"{name}.npy")
+            if os.path.exists(path):
+                extra[name] = np.load(path)
+        return cls(index['item_ids'], matrix, index['compression'], **extra)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in [self.matrix, self.scale, self.components, self.mean] if array is not None)
+
+    def fallback(self, item_id):
+        # Items without an embedding get a standard normal vector seeded by their id, identical across runs
+        return np.random.default_rng(zlib.crc32(str(item_id).encode())).normal(size=self.dim).astype(np.float32)
+
+    def decode(self, rows):
+        codes = self.matrix[rows].astype(np.float32)
+        if self.compression == 'int8':
+            return codes * self.scale[rows]
+        if self.compression == 'pca':
+            return codes @ self.components + self.mean
+        return codes
+
+    def __contains__(self, item_id):
+        return item_id in self.index
+
+    def __getitem__(self, item_id):
+        if item_id not in self.index:
+            return self.fallback(item_id)
+        return self.decode([self.index[item_id]])[0]
+
+    def lookup(self, item_ids):
+        embeddings = np.empty((len(item_ids), self.dim), dtype=np.float32)
+        found = [i for i, item_id in enumerate(item_ids) if item_id in self.index]
+        if len(found) > 0:
+            embeddings[found] = self.decode([self.index[item_ids[i]] for i in found])
+        for i, item_id in enumerate(item_ids):
+            if item_id not in self.index:
+                embeddings[i] = self.fallback(item_id)
+        return embeddings
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare pickled CLIP embeddings with an EmbeddingStore')
+    parser.add_argument('--pkl_path', type=str, required=True)
+    parser.add_argument('--store_dir', type=str, required=True)
+    parser.add_argument('--dtype', type=str, default='float32', choices=['float32', 'float16'])
+    parser.add_argument('--compression', type=str, default='none', choices=['none', 'int8', 'pca'])
+    parser.add_argument('--pca_dim', type=int, default=128)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    embedding_dict = pickle.load(open(args.pkl_path, "rb"))
+    pickle_time = time.perf_counter() - start
+    # Each value is a list of Python floats: an 8 byte pointer plus a 24 byte float object per entry
+    pickle_bytes = sum(sys.getsizeof(v) + 24 * len(v) for v in embedding_dict.values())
+
+    EmbeddingStore.build(embedding_dict, args.dtype, args.compression, args.pca_dim).save(args.store_dir)
+    start = time.perf_counter()
+    store = EmbeddingStore.load(args.store_dir)
+    store.lookup(store.item_ids)
+    store_time = time.perf_counter() - start
+
+    item_ids = list(embedding_dict.keys())
+    reference = np.array([embedding_dict[item_id] for item_id in item_ids], dtype=np.float32)
+    error = np.abs(store.lookup(item_ids) - reference).max()
+    print(f"pickle: {pickle_bytes / 2**20:.1f} MiB, load {pickle_time:.3f}s")
+    print(f"store:  {store.nbytes / 2**20:.1f} MiB, load+decode {store_time:.3f}s, max abs error {error:.4f}")
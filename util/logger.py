@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+from pytorch_lightning.loggers import Logger
+from pytorch_lightning.utilities import rank_zero_only
+
+
+class LocalLogger(Logger):
+    # Offline replacement for WandbLogger. log_metrics only appends to an in-memory queue, a background thread
+    # flushes the queue every flush_interval seconds to <save_dir>/<name>/<version>/metrics.jsonl (append-only).
+    def __init__(self, save_dir, name, version, flush_interval=1.0):
+        super().__init__()
+        self._save_dir = save_dir
+        self._name = name
+        self._version = version
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def save_dir(self):
+        return self._save_dir
+
+    @property
+    def log_dir(self):
+        return os.path.join(self._save_dir, self._name, self._version)
+
+    @rank_zero_only
+    def log_hyperparams(self, params):
+        if isinstance(params, argparse.Namespace):
+            params = vars(params)
+        os.makedirs(self.log_dir, exist_ok=True)
+        json.dump(params, open(os.path.join(self.log_dir, "hparams.json"), "w"), indent=2, default=str)
+
+    @rank_zero_only
+    def log_metrics(self, metrics, step=None):
+        if self.thread is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self.thread = threading.Thread(target=self.flush_loop, daemon=True)
+            self.thread.start()
+        self.queue.put({'step': step, 'time': time.time(), **{k: float(v) for k, v in metrics.items()}})
+
+    def flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        records = []
+        while not self.queue.empty():
+            records.append(self.queue.get())
+        if len(records) == 0:
+            return
+        with open(os.path.join(self.log_dir, "metrics.jsonl"), "a") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+
+    @rank_zero_only
+    def finalize(self, status):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+            self.stop_event.clear()
+
+
+def sync_to_wandb(log_dir, entity, project):
+    # Replays a LocalLogger run into a new wandb run, e.g. after copying log_dir off an air-gapped node
+    import wandb
+    hparams_path = os.path.join(log_dir, "hparams.json")
+    config = json.load(open(hparams_path, "r")) if os.path.exists(hparams_path) else {}
+    run = wandb.init(entity=entity, project=project, name=os.path.basename(os.path.normpath(log_dir)), config=config)
+    for line in open(os.path.join(log_dir, "metrics.jsonl"), "r"):
+        record = json.loads(line)
+        step = record.pop('step')
+        record.pop('time')
+        run.log(record, step=step)
+    run.finish()
+
+def benchmark(save_dir, num_steps=10000):
+    # Per-call cost of log_metrics for LocalLogger and for WandbLogger in offline mode
+    from pytorch_lightning import loggers as pl_loggers
+    metrics = {f"train_metric_{i}": 0.1 * i for i in range(10)}
+    loggers = {
+        'local': LocalLogger(save_dir, "benchmark", "local"),
+        'wandb_offline': pl_loggers.WandbLogger(save_dir=save_dir, offline=True, name="benchmark"),
+    }
+    for name, logger in loggers.items():
+        logger.log_metrics(metrics, step=0)
+        start = time.perf_counter()
+        for step in range(1, num_steps + 1):
+            logger.log_metrics(metrics, step=step)
+        elapsed = time.perf_counter() - start
+        logger.finalize("success")
+        print(f"{name}: {elapsed / num_steps * 1e6:.1f} us per log_metrics call")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sync or benchmark LocalLogger runs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync_parser = subparsers.add_parser('sync')
+    sync_parser.add_argument('--log_dir', type=str, required=True)
+    sync_parser.add_argument('--wandb_entity', type=str, default='bonbak')
+    sync_parser.add_argument('--wandb_proj', type=str, default='Multivariate-Time-Series-Forecasting')
+    benchmark_parser = subparsers.add_parser('benchmark')
+    benchmark_parser.add_argument('--save_dir', type=str, default='log/benchmark')
+    benchmark_parser.add_argument('--num_steps', type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        sync_to_wandb(args.log_dir, args.wandb_entity, args.wandb_proj)
+    else:
+        benchmark(args.save_dir, args.num_steps)
@@ -1,17 +1,24 @@
 from torchmetrics.regression import SymmetricMeanAbsolutePercentageError, WeightedMeanAbsolutePercentageError, MeanSquaredError, MeanAbsoluteError
+
+
+class AdjustedSymmetricMeanAbsolutePercentageError(SymmetricMeanAbsolutePercentageError):
+    # SMAPE scaled to [0, 1]; as a torchmetrics state it is summed across ranks before the final division
+    def compute(self):
+        return super().compute() * 0.5
+
     
 def get_score(gt, pred):
     pred = pred.detach().cpu()
     gt = gt.detach().cpu()
-    adjusted_smape = SymmetricMeanAbsolutePercentageError()
+    adjusted_smape = AdjustedSymmetricMeanAbsolutePercentageError()
     weighted_mape = WeightedMeanAbsolutePercentageError()
     mean_squared_error = MeanSquaredError()
     mean_absolute_error = MeanAbsoluteError()
     
     score = {}
-    score['adjusted_smape'] = adjusted_smape(pred, gt) * 0.5
+    score['adjusted_smape'] = adjusted_smape(pred, gt)
     score['wape'] = weighted_mape(pred, gt)
     score['mse'] = mean_squared_error(pred, gt)
     score['mae'] = mean_absolute_error(pred, gt)
 
-    return score
\ No newline at end of file
+    return score
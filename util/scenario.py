@@ -0,0 +1,35 @@
+import torch
+
+
+class Scenario:
+    # Transform of the exogenous inputs (batch, num_exo_vars, exo_input_len) described by "op:vars:value",
+    # e.g. "scale:0:1.1" (+10% on variable 0), "shift:1,2:-0.5", "set:all:0" or "baseline".
+    ops = {
+        'scale': lambda x, v: x * v,
+        'shift': lambda x, v: x + v,
+        'set': lambda x, v: torch.full_like(x, v),
+    }
+
+    def __init__(self, spec):
+        self.name = spec
+        if spec == 'baseline':
+            self.op, self.var_ids, self.value = None, None, None
+            return
+
+        op, var_ids, value = spec.split(':')
+        if op not in self.ops:
+            raise ValueError(f"Unknown scenario operation '{op}' in '{spec}', expected one of {list(self.ops)}")
+        self.op = self.ops[op]
+        self.var_ids = None if var_ids == 'all' else [int(v) for v in var_ids.split(',')]
+        self.value = float(value)
+
+    def __call__(self, exo_inputs):
+        if self.op is None:
+            return exo_inputs
+        exo_inputs = exo_inputs.clone()
+        var_ids = slice(None) if self.var_ids is None else self.var_ids
+        exo_inputs[:, var_ids] = self.op(exo_inputs[:, var_ids], self.value)
+        return exo_inputs
+
+    def __repr__(self):
+        return f"Scenario({self.name})"
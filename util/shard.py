@@ -0,0 +1,177 @@
+import os
+import json
+import queue
+import threading
+from collections import Counter
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from tqdm import tqdm
+
+
+EXO_KEYS = ['trend', 'weather', 'meta_sale']
+
+
+def source_signature(paths):
+    return {os.path.basename(path): [os.path.getmtime(path), os.path.getsize(path)] for path in paths}
+
+def shards_up_to_date(shard_dir, source_paths, build_params):
+    # Shards are rebuilt whenever one of the files they were converted from has changed since, or when they were
+    # built with other parameters (shard_size, or the dtype/compression of the embeddings they store)
+    index_path = os.path.join(shard_dir, "index.json")
+    if not os.path.exists(index_path):
+        return False
+    index = json.load(open(index_path, "r"))
+    if index.get('sources') == source_signature(source_paths) and index.get('build_params') == build_params:
+        return True
+    print(f"Rebuilding the shards in {shard_dir}, their source files or build parameters have changed")
+    return False
+
+def write_shards(data_dict, split_item_ids, shard_dir, shard_size=4096, source_paths=(), build_params=None):
+    # Converts the in-memory data_dict into fixed-size .npz shards per split plus an index.json of
+    # {item_id: [split, shard, row]}. Exogenous sources are stored separately and concatenated on read,
+    # so one set of shards serves every num_exo_vars configuration.
+    # The conversion itself still needs data.json in memory once; only training and evaluation from the
+    # shards are bounded by shard_size.
+    os.makedirs(shard_dir, exist_ok=True)
+    index = {'shard_size': shard_size, 'sources': source_signature(source_paths), 'build_params': build_params, 'splits': {}, 'items': {}}
+
+    for split, item_ids in split_item_ids.items():
+        index['splits'][split] = []
+        for start in tqdm(range(0, len(item_ids), shard_size), ascii=True, desc=split):
+            shard_item_ids = item_ids[start:start+shard_size]
+            shard_name = f"{split}-{start//shard_size:05d}.npz"
+            shard = {
+                'item_ids': np.array(shard_item_ids),
+                'item_sales': np.array([data_dict[item_id]['item_sales'] for item_id in shard_item_ids], dtype=np.float32),
+                'endo_inputs': np.array([data_dict[item_id]['endo_vars'] for item_id in shard_item_ids], dtype=np.float32),
+                'release_dates': np.array([data_dict[item_id]['release_date'] for item_id in shard_item_ids], dtype=np.float32),
+                'image_embeddings': data_dict['image_embedding'].lookup(shard_item_ids),
+                'text_embeddings': data_dict['text_embedding'].lookup(shard_item_ids),
+                'meta_data': np.array([data_dict[item_id]['meta_data'] for item_id in shard_item_ids], dtype=np.float32),
+            }
+            for key in EXO_KEYS:
+                if all(key in data_dict[item_id] for item_id in shard_item_ids):
+                    shard[key] = np.array([data_dict[item_id][key] for item_id in shard_item_ids], dtype=np.float32)
+            np.savez(os.path.join(shard_dir, shard_name), **shard)
+
+            index['splits'][split].append(shard_name)
+            for row, item_id in enumerate(shard_item_ids):
+                index['items'][item_id] = [split, shard_name, row]
+
+    # Written last, so an interrupted conversion is redone on the next run
+    json.dump(index, open(os.path.join(shard_dir, "index.json"), "w"))
+
+
+class ShardedDataset(IterableDataset):
+    # Streams the shards of one split, loading up to read_ahead shards in a background thread and
+    # shuffling samples within a buffer of buffer_size items when shuffle is set. Memory use depends on
+    # shard_size, read_ahead and buffer_size only, not on the size of the catalogue.
+    def __init__(self, args, shard_dir, split, item_ids=None, shuffle=False, buffer_size=4096, read_ahead=2):
+        super().__init__()
+        self.use_trend = args.use_trend
+        self.use_weather = args.use_weather
+        self.use_meta_sale = args.use_meta_sale
+        self.shard_dir = shard_dir
+        self.shuffle = shuffle
+        self.buffer_size = buffer_size
+        self.read_ahead = read_ahead
+
+        index = json.load(open(os.path.join(shard_dir, "index.json"), "r"))
+        self.shards = index['splits'][split]
+        if item_ids is None:
+            item_ids = [item_id for item_id, (item_split, _, _) in index['items'].items() if item_split == split]
+        # Counts, since DDP pads the training split by repeating items (see BasicDataModule.rank_item_ids)
+        item_ids = Counter(item_ids)
+        missing = [item_id for item_id in item_ids if index['items'].get(item_id, [None])[0] != split]
+        if len(missing) > 0:
+            raise KeyError(f"{len(missing)} {split} items are not in the shards of {shard_dir} (e.g. {missing[:5]}), rebuild them")
+        # Items in shard order, which is the order they are yielded in when shuffle is off
+        shard_ids = {shard: i for i, shard in enumerate(self.shards)}
+        location = sorted((shard_ids[shard], row, item_id) for item_id, (item_split, shard, row) in index['items'].items()
+                          if item_split == split and item_id in item_ids)
+        self.item_ids = [item_id for _, _, item_id in location for _ in range(item_ids[item_id])]
+        self.selected = item_ids
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def load_shard(self, shard_name):
+        shard = np.load(os.path.join(self.shard_dir, shard_name))
+        rows = np.array([row for row, item_id in enumerate(shard['item_ids']) for _ in range(self.selected[item_id])], dtype=np.int64)
+
+        exo = []
+        if self.use_trend: exo.append(shard['trend'])
+        if self.use_weather: exo.append(shard['weather'])
+        if self.use_meta_sale: exo.append(shard['meta_sale'])
+        exo_inputs = np.concatenate(exo, axis=1) if len(exo) > 0 else np.zeros((len(shard['item_ids']), 0), dtype=np.float32)
+
+        columns = [shard['item_sales'], shard['endo_inputs'], exo_inputs, shard['release_dates'],
+                   shard['image_embeddings'], shard['text_embeddings'], shard['meta_data']]
+        return [torch.from_numpy(column[rows]) for column in columns]
+
+    def read_shards(self, shards):
+        # Producer thread keeps the next read_ahead shards loaded while the current one is consumed. Errors are
+        # passed through the queue and re-raised here, and the producer stops once the consumer closes this
+        # generator (e.g. the sanity check or max_steps abandoning the DataLoader iterator).
+        shard_queue = queue.Queue(maxsize=self.read_ahead)
+        stop_event = threading.Event()
+
+        def put(item):
+            while not stop_event.is_set():
+                try:
+                    shard_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def producer():
+            try:
+                for shard_name in shards:
+                    if not put(self.load_shard(shard_name)):
+                        return
+            except Exception as e:
+                put(e)
+                return
+            put(None)
+
+        thread = threading.Thread(target=producer, daemon=True)
+        thread.start()
+        try:
+            while True:
+                columns = shard_queue.get()
+                if columns is None:
+                    return
+                if isinstance(columns, Exception):
+                    raise columns
+                yield columns
+        finally:
+            stop_event.set()
+            thread.join()
+
+    def __iter__(self):
+        shards = self.shards
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            shards = shards[worker_info.id::worker_info.num_workers]
+
+        if not self.shuffle:
+            for columns in self.read_shards(shards):
+                yield from zip(*columns)
+            return
+
+        # The torch RNG is seeded by random_seed and reseeded per worker and epoch by the DataLoader
+        rng = np.random.default_rng(torch.randint(0, 2**31, (1,)).item())
+        shards = [shards[i] for i in rng.permutation(len(shards))]
+        buffer = []
+        for columns in self.read_shards(shards):
+            for sample in zip(*columns):
+                if len(buffer) < self.buffer_size:
+                    buffer.append(sample)
+                    continue
+                i = rng.integers(len(buffer))
+                yield buffer[i]
+                buffer[i] = sample
+        for i in rng.permutation(len(buffer)):
+            yield buffer[i]
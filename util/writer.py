@@ -0,0 +1,74 @@
+import os
+import glob
+import importlib.util
+import numpy as np
+
+
+class ResultWriter:
+    # Writes every predicted batch to its own shard in result_dir, as Parquet (item_id + one column per horizon)
+    # when pyarrow is installed, otherwise as part-XXXXX.npy forecasts with an ids-XXXXX.npy item-id index.
+    # Shards are written atomically, so the item ids found on disk are exactly the ones that are done.
+    def __init__(self, result_dir, result_format='auto'):
+        # pyarrow is only imported once Parquet shards are actually read or written
+        has_pyarrow = importlib.util.find_spec("pyarrow") is not None
+        if result_format == 'auto':
+            result_format = 'parquet' if has_pyarrow else 'npy'
+        if result_format == 'parquet' and not has_pyarrow:
+            raise ImportError("pyarrow is required for result_format='parquet'")
+        self.result_dir = result_dir
+        self.result_format = result_format
+        self.offset = 0
+        os.makedirs(result_dir, exist_ok=True)
+        # Continues after the highest existing shard index, a gap left by a deleted shard must not be overwritten
+        self.num_shards = max([int(os.path.basename(path)[len("part-"):].split(".")[0]) for path in self.shard_paths()], default=-1) + 1
+
+    def shard_paths(self):
+        return sorted(glob.glob(os.path.join(self.result_dir, f"part-*.{self.result_format}")))
+
+    def completed_item_ids(self):
+        return set(item_id for item_ids, _ in self.read_shards() for item_id in item_ids)
+
+    def read_shards(self):
+        for path in self.shard_paths():
+            if self.result_format == 'parquet':
+                import pyarrow.parquet as pq
+                table = pq.read_table(path)
+                item_ids = table.column('item_id').to_pylist()
+                forecast = np.stack([table.column(name).to_numpy() for name in table.column_names[1:]], axis=1)
+            else:
+                item_ids = np.load(path.replace("part-", "ids-")).tolist()
+                forecast = np.load(path)
+            yield item_ids, forecast
+
+    def write_batch(self, prediction, dataset_item_ids):
+        # The predict dataloader is not shuffled, so batches arrive in item_ids order
+        forecast = prediction.detach().cpu().numpy()
+        item_ids = dataset_item_ids[self.offset:self.offset+len(forecast)]
+        self.offset += len(forecast)
+
+        path = os.path.join(self.result_dir, f"part-{self.num_shards:05d}.{self.result_format}")
+        if self.result_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            columns = {'item_id': pa.array(item_ids)}
+            columns.update({str(h): pa.array(forecast[:, h]) for h in range(forecast.shape[1])})
+            pq.write_table(pa.table(columns), path + ".tmp")
+        else:
+            ids_path = path.replace("part-", "ids-")
+            with open(ids_path + ".tmp", "wb") as f:
+                np.save(f, np.array(item_ids))
+            os.replace(ids_path + ".tmp", ids_path)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, forecast)
+        os.replace(path + ".tmp", path)
+        self.num_shards += 1
+
+    def export_csv(self, csv_path):
+        with open(csv_path, "w") as f:
+            header_written = False
+            for item_ids, forecast in self.read_shards():
+                if not header_written:
+                    f.write("," + ",".join(str(h) for h in range(forecast.shape[1])) + "\n")
+                    header_written = True
+                for item_id, row in zip(item_ids, forecast):
+                    f.write(f"{item_id}," + ",".join(map(str, row)) + "\n")